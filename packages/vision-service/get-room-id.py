@@ -2,17 +2,22 @@
 """
 Quick script to get a room ID from the dashboard API
 """
-import requests
+import os
 import sys
 
-DASHBOARD_URL = "http://localhost:3000"
-API_KEY = "vision_service_key_12345"
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from dashboard_client import make_client
+
+load_dotenv()
+
+client = make_client()
 
 try:
     # Try to get facility status (requires auth, but let's try)
-    response = requests.get(
-        f"{DASHBOARD_URL}/api/facility/rooms",
-        headers={"x-api-key": API_KEY},
+    response = client.session.get(
+        f"{client.base_url}/api/facility/rooms",
         timeout=5
     )
     
@@ -40,6 +45,8 @@ try:
 except Exception as e:
     print(f"\nError: {e}\n")
     print("Backend might not be running or API key auth not working.")
+finally:
+    client.close()
 
 print("\nTrying database query instead...")
 print("Run this in your backend terminal:")
@@ -3,11 +3,18 @@ Camera connection and frame capture
 """
 import cv2
 import logging
+import threading
+import time
 from typing import Optional
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Frames to grab (and discard) before each retrieve, so we never process
+# a stale frame sitting in the backend's queue. Backends that ignore
+# CAP_PROP_BUFFERSIZE still buffer a few frames, hence more than one.
+DRAIN_FRAMES = 4
+
 
 class Camera:
     """Manages webcam connection and frame capture"""
@@ -17,6 +24,13 @@ class Camera:
         self.camera_name = camera_name
         self.capture: Optional[cv2.VideoCapture] = None
         self.is_connected = False
+        self.grayscale = False  # True when the backend delivers single-channel (luma) frames
+        
+        # Background reader state (see start_async). The lock serialises all
+        # capture calls once the reader is running.
+        self._reader_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._grabbed = False
         
     def connect(self) -> bool:
         """Connect to the camera"""
@@ -32,29 +46,108 @@ class Camera:
             self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
             self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
             self.capture.set(cv2.CAP_PROP_FPS, 30)
+            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
+            # Ask for luma-only frames so the detector can skip the BGR->gray
+            # conversion. Not every backend honours this, so the test read decides.
+            # Save the current settings first: FORMAT=-1 means "raw stream", not default.
+            original_convert_rgb = self.capture.get(cv2.CAP_PROP_CONVERT_RGB)
+            original_format = self.capture.get(cv2.CAP_PROP_FORMAT)
+            self.capture.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            self.capture.set(cv2.CAP_PROP_FORMAT, cv2.CV_8UC1)
             
             # Test read
             ret, frame = self.capture.read()
+            if not ret or frame is None or not self._is_grayscale(frame):
+                # Ignored, unsupported, or handed back raw YUV - go back to regular BGR frames
+                self.capture.set(cv2.CAP_PROP_CONVERT_RGB, original_convert_rgb)
+                self.capture.set(cv2.CAP_PROP_FORMAT, original_format)
+                ret, frame = self.capture.read()
+                
+                if ret and frame is not None and frame.ndim != 3:
+                    logger.error(f"Camera returned an unsupported frame format (shape {frame.shape})")
+                    return False
+            
             if not ret or frame is None:
                 logger.error("Camera opened but cannot read frames")
                 return False
             
             self.is_connected = True
+            self.grayscale = self._is_grayscale(frame)
+            with self._lock:
+                # The test frame can still be retrieved, so get_frame() has
+                # something to return before the reader's first grab
+                self._grabbed = True
             logger.info(f"✓ Connected to {self.camera_name}")
-            logger.info(f"  Resolution: {frame.shape[1]}x{frame.shape[0]}")
+            logger.info(f"  Resolution: {frame.shape[1]}x{frame.shape[0]} ({'grayscale' if self.grayscale else 'BGR'})")
             return True
             
         except Exception as e:
             logger.error(f"Error connecting to camera: {e}")
             return False
     
+    def _is_grayscale(self, frame: np.ndarray) -> bool:
+        """
+        True for a proper single-channel image at the capture resolution
+        
+        Rejects flat raw buffers and packed YUYV, which is also 2-D uint8 but twice as wide.
+        """
+        if frame.ndim != 2 or frame.dtype != np.uint8:
+            return False
+        
+        height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        return frame.shape[:2] == (height, width)
+    
+    def start_async(self):
+        """
+        Start grabbing frames on a background thread
+        
+        The reader only grab()s, which keeps the capture queue drained without
+        decoding every frame. get_frame() retrieve()s (decodes) the newest grabbed
+        frame, so only the frames we actually process are decoded.
+        """
+        if not self.is_connected or self._reader_thread is not None:
+            return
+        
+        self._reader_thread = threading.Thread(target=self._reader, name="camera-reader", daemon=True)
+        self._reader_thread.start()
+        logger.info("Background frame reader started")
+    
+    def _reader(self):
+        """Continuously grab frames so the newest one is always ready to retrieve"""
+        while self.is_connected and self.capture is not None:
+            try:
+                with self._lock:
+                    self._grabbed = self.capture.grab()
+            except Exception as e:
+                logger.error("Error grabbing frame: %s", e)
+                with self._lock:
+                    self._grabbed = False
+            
+            # Back off if the camera stops delivering frames; otherwise yield
+            # briefly so get_frame() can take the lock between grabs
+            time.sleep(0.05 if not self._grabbed else 0.001)
+    
     def get_frame(self) -> Optional[np.ndarray]:
         """Capture a single frame from the camera"""
         if not self.is_connected or self.capture is None:
             return None
         
         try:
-            ret, frame = self.capture.read()
+            if self._reader_thread is not None:
+                with self._lock:
+                    ret, frame = self.capture.retrieve() if self._grabbed else (False, None)
+                if not ret or frame is None:
+                    logger.warning("Failed to read frame from camera")
+                    return None
+                return frame
+            
+            # Drain buffered frames so we always work on the newest one
+            for _ in range(DRAIN_FRAMES):
+                self.capture.grab()
+            
+            ret, frame = self.capture.retrieve()
             if not ret or frame is None:
                 logger.warning("Failed to read frame from camera")
                 return None
@@ -62,14 +155,23 @@ class Camera:
             return frame
             
         except Exception as e:
-            logger.error(f"Error reading frame: {e}")
+            logger.error("Error reading frame: %s", e)
             return None
     
     def disconnect(self):
         """Release the camera"""
         if self.capture is not None:
-            self.capture.release()
             self.is_connected = False
+            if self._reader_thread is not None:
+                self._reader_thread.join(timeout=2.0)
+                if self._reader_thread.is_alive():
+                    # Still blocked inside grab() - releasing now would pull the
+                    # capture out from under it
+                    logger.warning(f"Camera reader did not stop; leaving {self.camera_name} open")
+                    return
+                self._reader_thread = None
+            self._grabbed = False
+            self.capture.release()
             logger.info(f"Disconnected from {self.camera_name}")
     
     def is_healthy(self) -> bool:
@@ -1,13 +1,27 @@
 """
 Dashboard backend API client
 """
+import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# How long a successful room status update is remembered; repeating the
+# same status within this window is a no-op and skips the network.
+STATUS_CACHE_TTL_SECONDS = 30
+
+DEFAULT_DASHBOARD_URL = 'http://localhost:3000'
+DEFAULT_DASHBOARD_API_KEY = 'vision_service_key_12345'
+
+# (connect, read) timeout for API calls - fail fast if the backend is unreachable
+REQUEST_TIMEOUT = (2, 5)
+
 
 class DashboardClient:
     """Client for communicating with the dashboard backend"""
@@ -16,13 +30,73 @@ class DashboardClient:
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
         self.session = requests.Session()
+        
+        # Retry transient gateway errors on the pooled connection instead of
+        # failing straight away. POST is left out of status retries so a
+        # slow-but-successful create isn't duplicated.
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=('GET', 'HEAD', 'PUT'),
+                raise_on_status=False
+            )
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json'
         })
         
+        # room_id -> (status, time.monotonic() of the successful update)
+        self._status_cache: Dict[str, Tuple[str, float]] = {}
+        
+        # Flipped off the first time the backend answers 404 on /api/_batch
+        self.batch_supported = True
+        
         logger.info(f"Dashboard client initialized: {base_url}")
     
+    def _room_status_op(self, room_id: str, status: str) -> Dict[str, Any]:
+        """Build the request that updates a room's status"""
+        return {
+            'method': 'PUT',
+            'path': f"/api/facility/rooms/{room_id}/status",
+            'body': {'status': status}
+        }
+    
+    def _action_item_op(
+        self,
+        title: str,
+        description: str,
+        urgency: str = 'normal',
+        action_type: str = 'room_issue',
+        room_id: Optional[str] = None,
+        reasoning: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the request that creates an action item"""
+        body = {
+            'type': action_type,
+            'urgency': urgency,
+            'title': title,
+            'description': description,
+            'context': {
+                'source': 'vision_service',
+                'timestamp': datetime.now().isoformat()
+            }
+        }
+        
+        if room_id:
+            body['roomId'] = room_id
+        
+        if reasoning:
+            body['reasoning'] = reasoning
+        
+        return {'method': 'POST', 'path': '/api/actions', 'body': body}
+    
     def update_room_status(self, room_id: str, status: str) -> bool:
         """
         Update room status in the dashboard
@@ -34,29 +108,47 @@ class DashboardClient:
         Returns:
             True if successful, False otherwise
         """
+        if self._status_is_cached(room_id, status):
+            logger.debug("Room %s already %s, skipping update", room_id, status)
+            return True
+        
         try:
-            url = f"{self.base_url}/api/facility/rooms/{room_id}/status"
-            payload = {
-                'status': status
-            }
+            op = self._room_status_op(room_id, status)
+            url = f"{self.base_url}{op['path']}"
             
             logger.info(f"Updating room {room_id} status to: {status}")
-            response = self.session.put(url, json=payload, timeout=5)
+            response = self.session.put(url, json=op['body'], timeout=REQUEST_TIMEOUT)
             
             if response.status_code == 200:
                 logger.info(f"✓ Room status updated successfully")
+                self._record_room_status(room_id, status, True)
                 return True
             else:
                 logger.error(f"Failed to update room status: {response.status_code} - {response.text}")
+                self._record_room_status(room_id, status, False)
                 return False
                 
         except requests.exceptions.Timeout:
             logger.error("Request timeout updating room status")
+            self._record_room_status(room_id, status, False)
             return False
         except Exception as e:
             logger.error(f"Error updating room status: {e}")
+            self._record_room_status(room_id, status, False)
             return False
     
+    def _status_is_cached(self, room_id: str, status: str) -> bool:
+        """True if this status was successfully sent for the room within the TTL"""
+        cached = self._status_cache.get(room_id)
+        return bool(cached) and cached[0] == status and time.monotonic() - cached[1] < STATUS_CACHE_TTL_SECONDS
+    
+    def _record_room_status(self, room_id: str, status: str, ok: bool):
+        """Remember a successful status PUT, or forget the room after a failed one"""
+        if ok:
+            self._status_cache[room_id] = (status, time.monotonic())
+        else:
+            self._status_cache.pop(room_id, None)
+    
     def create_action_item(
         self,
         title: str,
@@ -81,26 +173,11 @@ class DashboardClient:
             True if successful, False otherwise
         """
         try:
-            url = f"{self.base_url}/api/actions"
-            payload = {
-                'type': action_type,
-                'urgency': urgency,
-                'title': title,
-                'description': description,
-                'context': {
-                    'source': 'vision_service',
-                    'timestamp': datetime.now().isoformat()
-                }
-            }
-            
-            if room_id:
-                payload['roomId'] = room_id
-            
-            if reasoning:
-                payload['reasoning'] = reasoning
+            op = self._action_item_op(title, description, urgency, action_type, room_id, reasoning)
+            url = f"{self.base_url}{op['path']}"
             
             logger.info(f"Creating action item: {title}")
-            response = self.session.post(url, json=payload, timeout=5)
+            response = self.session.post(url, json=op['body'], timeout=REQUEST_TIMEOUT)
             
             if response.status_code == 201:
                 logger.info(f"✓ Action item created successfully")
@@ -116,11 +193,80 @@ class DashboardClient:
             logger.error(f"Error creating action item: {e}")
             return False
     
+    def update_status_with_action(self, room_id: str, status: str, **action: Any) -> Optional[Tuple[bool, bool]]:
+        """
+        Update room status and create an action item in one /api/_batch request
+        
+        The endpoint is all-or-nothing: 200 means both operations were applied.
+        
+        Args:
+            room_id: Room UUID
+            status: New room status
+            **action: Arguments for create_action_item
+        
+        Returns:
+            (status_ok, action_ok), or None if the backend has no batch endpoint
+            and the caller should fall back to the single-call helpers
+        """
+        if not self.batch_supported:
+            return None
+        
+        ops = [self._room_status_op(room_id, status), self._action_item_op(**action)]
+        try:
+            url = f"{self.base_url}/api/_batch"
+            
+            logger.info(f"Sending batch: room {room_id} -> {status} + action item")
+            response = self.session.post(url, json={'requests': ops}, timeout=REQUEST_TIMEOUT)
+            
+            if response.status_code == 404:
+                logger.info("Batch endpoint not available, using single requests")
+                self.batch_supported = False
+                return None
+            
+            if response.status_code != 200:
+                logger.error(f"Failed to send batch: {response.status_code} - {response.text}")
+                self._record_room_status(room_id, status, False)
+                return False, False
+            
+            self._record_room_status(room_id, status, True)
+            return True, True
+            
+        except requests.exceptions.Timeout:
+            logger.error("Request timeout sending batch")
+            self._record_room_status(room_id, status, False)
+            return False, False
+        except Exception as e:
+            logger.error(f"Error sending batch: {e}")
+            self._record_room_status(room_id, status, False)
+            return False, False
+    
+    def close(self):
+        """Close the pooled connections"""
+        self.session.close()
+    
     def health_check(self) -> bool:
         """Check if dashboard backend is reachable"""
         try:
-            url = f"{self.base_url}/api/auth/me"
-            response = self.session.get(url, timeout=3)
-            return response.status_code in [200, 401]  # 401 means server is up but auth failed
+            # HEAD on the backend's unauthenticated /health route: no body, no DB work
+            url = f"{self.base_url}/health"
+            response = self.session.head(url, timeout=3, allow_redirects=False)
+            return response.status_code in [200, 401, 405]  # 401/405 still mean the server is up
         except Exception:
             return False
+
+
+def make_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> DashboardClient:
+    """
+    Create a DashboardClient configured from the environment
+    
+    The service and the helper scripts all go through this, so they share
+    the same headers, retry policy and keep-alive session setup.
+    
+    Args:
+        base_url: Overrides DASHBOARD_URL
+        api_key: Overrides DASHBOARD_API_KEY
+    """
+    return DashboardClient(
+        base_url or os.getenv('DASHBOARD_URL', DEFAULT_DASHBOARD_URL),
+        api_key or os.getenv('DASHBOARD_API_KEY', DEFAULT_DASHBOARD_API_KEY)
+    )
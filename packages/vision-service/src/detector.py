@@ -4,47 +4,106 @@ Motion and occupancy detection using OpenCV
 import cv2
 import numpy as np
 import logging
+import time
+from collections import deque
 from typing import Optional, Tuple
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
 
+def _cuda_available() -> bool:
+    """True when OpenCV was built with CUDA and a GPU is present"""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+
 class OccupancyDetector:
     """Detects room occupancy using motion detection"""
     
     def __init__(self, motion_threshold: int = 500, confidence_threshold: float = 0.7):
-        self.motion_threshold = motion_threshold
         self.confidence_threshold = confidence_threshold
         
-        # Background subtractor for motion detection
-        self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
-            history=500,
-            varThreshold=16,
-            detectShadows=True
-        )
+        # Frames are downsampled before processing - a binary occupied/available
+        # decision doesn't need full resolution. motion_threshold is given in
+        # full-resolution pixels, so rescale it to the working size.
+        self._scale = 0.25
+        self._blur_ksize = (5, 5)  # Box blur; only needs to knock down sensor noise
+        self.motion_threshold = max(1, round(motion_threshold * self._scale ** 2))
+        
+        # Background subtractor for motion detection (on the GPU when available)
+        self.history = 500
+        self._frames_seen = 0  # apply() calls so far; MOG2's own rate depends on it
+        self.use_cuda = _cuda_available()
+        if self.use_cuda:
+            self.bg_subtractor = cv2.cuda.createBackgroundSubtractorMOG2(
+                history=self.history,
+                varThreshold=16,
+                detectShadows=False
+            )
+            self._gpu_frame = cv2.cuda_GpuMat()
+            self._gpu_blur = cv2.cuda.createBoxFilter(cv2.CV_8UC1, cv2.CV_8UC1, self._blur_ksize)
+            self._gpu_stream = cv2.cuda.Stream_Null()
+        else:
+            self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
+                history=self.history,
+                varThreshold=16,
+                detectShadows=False
+            )
+        
+        # Working buffers, reused across frames (sized on the first frame)
+        self._frame_shape: Optional[Tuple[int, ...]] = None
+        self._small_size: Tuple[int, int] = (0, 0)
+        self._small: Optional[np.ndarray] = None
+        self._gray: Optional[np.ndarray] = None
+        self._blur: Optional[np.ndarray] = None
+        self._mask: Optional[np.ndarray] = None
         
         # State tracking
-        self.previous_frame: Optional[np.ndarray] = None
         self.current_status = "available"
-        self.last_motion_time: Optional[datetime] = None
-        self.last_status_change: Optional[datetime] = None
-        self.motion_frames_count = 0
-        self.no_motion_frames_count = 0
+        # Monotonic timestamps (time.monotonic()) - cheap to read every frame
+        self.last_motion_time: Optional[float] = None
+        self.last_status_change: Optional[float] = None
+        
+        # Smoothed (EMA) motion pixel count, used to decide when the room is idle
+        self.recent_motion_pixels = 0.0
+        self._motion_ema_alpha = 0.3
+        
+        # Thresholds for state changes - fractions of motion frames over a window,
+        # so a single stray or missed frame doesn't reset the decision
+        self.motion_frames_required = 5  # occupied window (~2.5s at 2 FPS)
+        self.no_motion_frames_required = 40  # available window (~20s at 2 FPS)
+        self.occupied_motion_ratio = 0.8  # at least 4 of the last 5 frames
+        self.available_motion_ratio = 0.05  # at most 1 of the last 40 frames
         
-        # Thresholds for state changes
-        self.motion_frames_required = 3  # 3 consecutive frames with motion (~1.5s at 2 FPS)
-        self.no_motion_frames_required = 40  # 40 consecutive frames without motion (~20s at 2 FPS)
+        # Per-frame motion flags for the last max(window) frames, with running
+        # motion counts so each frame is O(1)
+        self._recent = deque(maxlen=max(self.motion_frames_required, self.no_motion_frames_required))
+        self._motion_frames = 0  # over the occupied window
+        self._window_motion_frames = 0  # over the whole deque
+        self.motion_ratio = 0.0
+        self.window_motion_ratio = 0.0
+        
+        # Ratios for full windows, indexed by motion frame count
+        self._motion_ratios = tuple(i / self.motion_frames_required for i in range(self.motion_frames_required + 1))
+        self._window_ratios = tuple(i / self._recent.maxlen for i in range(self._recent.maxlen + 1))
         
         # Cooldown: minimum time to stay in "occupied" before allowing transition to "available"
         self.occupied_cooldown_seconds = 30
         
-        logger.info(f"Occupancy detector initialized (threshold: {motion_threshold})")
+        logger.info(f"Occupancy detector initialized (threshold: {motion_threshold}, scaled: {self.motion_threshold}, cuda: {self.use_cuda})")
     
-    def detect(self, frame: np.ndarray) -> Tuple[str, float, bool]:
+    def detect(self, frame: np.ndarray, frame_interval: int = 1) -> Tuple[str, float, bool]:
         """
         Detect occupancy in the frame
         
+        Args:
+            frame: Camera frame (BGR or grayscale)
+            frame_interval: Frame periods since the previous call; when frames
+                are skipped the background model learns proportionally faster
+        
         Returns:
             (status, confidence, changed) tuple
             - status: 'occupied' or 'available'
@@ -54,73 +113,147 @@ class OccupancyDetector:
         if frame is None:
             return self.current_status, 0.0, False
         
-        # Convert to grayscale for processing
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
+        # -1 lets MOG2 pick its own rate, 1/min(2*nframes, history). When frames
+        # were skipped, scale that same rate up to cover them (warm-up included)
+        self._frames_seen += 1
+        if frame_interval <= 1:
+            learning_rate = -1.0
+        else:
+            learning_rate = min(1.0, frame_interval / min(2 * self._frames_seen, self.history))
         
-        # Apply background subtraction
-        fg_mask = self.bg_subtractor.apply(gray)
+        if self.use_cuda:
+            motion_pixels = self._count_motion_pixels_cuda(frame, learning_rate)
+            has_motion = motion_pixels > self.motion_threshold
+        else:
+            self._ensure_buffers(frame)
+            cv2.resize(frame, self._small_size, dst=self._small, interpolation=cv2.INTER_AREA)
+            
+            # Convert to grayscale for processing (camera may already deliver luma)
+            if self._small.ndim == 2:
+                gray = self._small
+            else:
+                gray = cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+            cv2.blur(gray, self._blur_ksize, dst=self._blur)
+            
+            # Apply background subtraction
+            fg_mask = self.bg_subtractor.apply(self._blur, self._mask, learning_rate)
+            
+            # Calculate motion amount
+            motion_pixels = cv2.countNonZero(fg_mask)
+            has_motion = motion_pixels > self.motion_threshold
         
-        # Calculate motion amount
-        motion_pixels = cv2.countNonZero(fg_mask)
-        has_motion = motion_pixels > self.motion_threshold
+        # Clamp before smoothing so one very busy frame doesn't hold off idle
+        # detection for many seconds while the EMA decays
+        clamped_pixels = min(motion_pixels, self.motion_threshold + 1)
+        self.recent_motion_pixels += self._motion_ema_alpha * (clamped_pixels - self.recent_motion_pixels)
+        now = time.monotonic()
         
         # Update motion tracking
         if has_motion:
-            self.last_motion_time = datetime.now()
-            self.motion_frames_count += 1
-            self.no_motion_frames_count = 0
-        else:
-            self.motion_frames_count = 0
-            self.no_motion_frames_count += 1
+            self.last_motion_time = now
+        self._update_motion_window(has_motion)
         
         # Determine status and confidence
         previous_status = self.current_status
-        confidence = 0.0
+        new_status = previous_status
         
-        if self.motion_frames_count >= self.motion_frames_required:
+        if len(self._recent) >= self.motion_frames_required and self.motion_ratio >= self.occupied_motion_ratio:
             # Consistent motion detected - room is occupied
-            self.current_status = "occupied"
-            confidence = min(1.0, self.motion_frames_count / 10.0)
-        elif self.no_motion_frames_count >= self.no_motion_frames_required:
+            new_status = "occupied"
+            confidence = self.motion_ratio
+        elif len(self._recent) >= self.no_motion_frames_required and self.window_motion_ratio < self.available_motion_ratio:
             # No motion for a sustained period
             # But only transition to available if we've been occupied long enough (cooldown)
             if self.current_status == "occupied" and self.last_status_change is not None:
-                time_in_occupied = (datetime.now() - self.last_status_change).total_seconds()
+                time_in_occupied = now - self.last_status_change
                 if time_in_occupied < self.occupied_cooldown_seconds:
                     # Still in cooldown — stay occupied
                     confidence = 0.5
                 else:
-                    self.current_status = "available"
-                    confidence = min(1.0, self.no_motion_frames_count / 60.0)
+                    new_status = "available"
+                    confidence = 1.0 - self.window_motion_ratio
             else:
-                self.current_status = "available"
-                confidence = min(1.0, self.no_motion_frames_count / 60.0)
+                new_status = "available"
+                confidence = 1.0 - self.window_motion_ratio
         else:
             # Uncertain state - keep previous status
             confidence = 0.5
         
         # Check if status changed
         changed = False
-        if self.current_status != previous_status and confidence >= self.confidence_threshold:
+        if new_status != previous_status and confidence >= self.confidence_threshold:
+            self.current_status = new_status
             changed = True
-            self.last_status_change = datetime.now()
-            logger.info(f"Status changed: {previous_status} → {self.current_status} (confidence: {confidence:.2f})")
+            self.last_status_change = now
+            logger.info("Status changed: %s → %s (confidence: %.2f)", previous_status, self.current_status, confidence)
         
-        self.previous_frame = gray
         return self.current_status, confidence, changed
     
+    def _ensure_buffers(self, frame: np.ndarray):
+        """(Re)allocate the working buffers when the input frame shape changes"""
+        if frame.shape == self._frame_shape:
+            return
+        
+        height, width = frame.shape[:2]
+        small_w = max(1, round(width * self._scale))
+        small_h = max(1, round(height * self._scale))
+        
+        self._small_size = (small_w, small_h)
+        self._small = np.empty((small_h, small_w) + frame.shape[2:], np.uint8)
+        self._gray = np.empty((small_h, small_w), np.uint8)
+        self._blur = np.empty_like(self._gray)
+        self._mask = np.empty_like(self._gray)
+        self._frame_shape = frame.shape
+    
+    def _update_motion_window(self, has_motion: bool):
+        """Push this frame's motion flag and refresh the window ratios"""
+        recent = self._recent
+        
+        # Drop the flags that fall out of each window
+        if len(recent) == recent.maxlen:
+            self._window_motion_frames -= recent[0]
+        if len(recent) >= self.motion_frames_required:
+            self._motion_frames -= recent[-self.motion_frames_required]
+        
+        recent.append(has_motion)
+        self._motion_frames += has_motion
+        self._window_motion_frames += has_motion
+        
+        # Table lookup once the windows are full; divide only while warming up
+        if len(recent) >= self.motion_frames_required:
+            self.motion_ratio = self._motion_ratios[self._motion_frames]
+        else:
+            self.motion_ratio = self._motion_frames / len(recent)
+        
+        if len(recent) == recent.maxlen:
+            self.window_motion_ratio = self._window_ratios[self._window_motion_frames]
+        else:
+            self.window_motion_ratio = self._window_motion_frames / len(recent)
+    
+    def is_idle(self) -> bool:
+        """True when the room is available and has shown almost no motion recently"""
+        return self.current_status == "available" and self.recent_motion_pixels < self.motion_threshold / 10
+    
+    def _count_motion_pixels_cuda(self, frame: np.ndarray, learning_rate: float) -> int:
+        """GPU version of the grayscale/blur/MOG2 pipeline; the mask stays on-device"""
+        self._gpu_frame.upload(frame)
+        small = cv2.cuda.resize(self._gpu_frame, (0, 0), fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+        gray = small if frame.ndim == 2 else cv2.cuda.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = self._gpu_blur.apply(gray)
+        fg_mask = self.bg_subtractor.apply(gray, learning_rate, self._gpu_stream)
+        return cv2.cuda.countNonZero(fg_mask)
+    
     def get_time_since_last_motion(self) -> Optional[timedelta]:
         """Get time elapsed since last motion was detected"""
         if self.last_motion_time is None:
             return None
-        return datetime.now() - self.last_motion_time
+        return timedelta(seconds=time.monotonic() - self.last_motion_time)
     
     def get_time_since_status_change(self) -> Optional[timedelta]:
         """Get time elapsed since last status change"""
         if self.last_status_change is None:
             return None
-        return datetime.now() - self.last_status_change
+        return timedelta(seconds=time.monotonic() - self.last_status_change)
     
     def should_trigger_cleaning(self, cleaning_timeout_minutes: int) -> bool:
         """
@@ -130,8 +263,7 @@ class OccupancyDetector:
         if self.current_status != "available":
             return False
         
-        time_since_change = self.get_time_since_status_change()
-        if time_since_change is None:
+        if self.last_status_change is None:
             return False
         
-        return time_since_change.total_seconds() >= (cleaning_timeout_minutes * 60)
+        return time.monotonic() - self.last_status_change >= (cleaning_timeout_minutes * 60)
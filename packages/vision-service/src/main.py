@@ -7,12 +7,15 @@ import os
 import sys
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
 from dotenv import load_dotenv
 
 from camera import Camera
 from detector import OccupancyDetector
-from dashboard_client import DashboardClient
+from dashboard_client import make_client
 
 # Load environment variables
 load_dotenv()
@@ -25,6 +28,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Process frames this many times less often while the room is idle
+IDLE_SLOWDOWN = 4
+
+# Dashboard updates are held this long so a burst collapses into one call
+UPDATE_DEBOUNCE_SECONDS = 0.5
+
+# How long stop() waits for the final dashboard flush
+SHUTDOWN_FLUSH_TIMEOUT_SECONDS = 10
+
 
 class VisionService:
     """Main vision service coordinator"""
@@ -40,22 +52,29 @@ class VisionService:
         self.occupancy_confidence = float(os.getenv('OCCUPANCY_CONFIDENCE', '0.7'))
         self.cleaning_timeout_minutes = int(os.getenv('CLEANING_TIMEOUT_MINUTES', '5'))
         
-        # Dashboard configuration
-        dashboard_url = os.getenv('DASHBOARD_URL', 'http://localhost:3000')
-        dashboard_api_key = os.getenv('DASHBOARD_API_KEY', 'vision_service_key_12345')
-        
         # Initialize components
         self.camera = Camera(self.camera_index, self.camera_name)
         self.detector = OccupancyDetector(self.motion_threshold, self.occupancy_confidence)
-        self.dashboard = DashboardClient(dashboard_url, dashboard_api_key)
+        self.dashboard = make_client()  # DASHBOARD_URL / DASHBOARD_API_KEY
         
         # State tracking
         self.running = False
         self.last_cleaning_check = None
         self.cleaning_action_created = False
         self.debug_logging = os.getenv('DEBUG_LOGGING', 'false').lower() == 'true'
+        self._frame_count = 0
+        self._log_every = 10  # Debug log interval in frames
         self.last_dashboard_status = None  # Track what we last sent to avoid redundant updates
         
+        # Dashboard calls run on a single background worker so a slow backend
+        # never stalls detection. Updates are debounced and coalesced: only the
+        # latest status is sent once things settle.
+        self._net = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dashboard')
+        self._pending_lock = threading.Lock()
+        self._pending_status: Optional[str] = None
+        self._pending_cleaning = False
+        self._debounce_timer: Optional[threading.Timer] = None
+        
     def start(self):
         """Start the vision service"""
         logger.info("=" * 60)
@@ -72,6 +91,9 @@ class VisionService:
             logger.error("Failed to connect to camera. Exiting.")
             return False
         
+        # Read frames off the detection loop so processing never waits on the camera
+        self.camera.start_async()
+        
         # Check dashboard connection
         logger.info("Checking dashboard connection...")
         if not self.dashboard.health_check():
@@ -88,8 +110,8 @@ class VisionService:
         self.running = True
         return True
     
-    def process_frame(self):
-        """Process a single frame"""
+    def process_frame(self, frame_interval: int = 1):
+        """Process a single frame (frame_interval: frame periods since the last one)"""
         # Capture frame
         frame = self.camera.get_frame()
         if frame is None:
@@ -97,51 +119,108 @@ class VisionService:
             return
         
         # Detect occupancy
-        status, confidence, changed = self.detector.detect(frame)
+        status, confidence, changed = self.detector.detect(frame, frame_interval)
         
         # Debug: Log detection info every 10 frames (every 5 seconds at 2 FPS)
         if self.debug_logging:
-            if hasattr(self, '_frame_count'):
-                self._frame_count += 1
-            else:
-                self._frame_count = 1
-            
-            if self._frame_count % 10 == 0:
-                logger.info(f"[DEBUG] Status: {status}, Confidence: {confidence:.2f}, Motion frames: {self.detector.motion_frames_count}, No-motion frames: {self.detector.no_motion_frames_count}")
+            self._frame_count += 1
+            if self._frame_count % self._log_every == 0:
+                logger.info(
+                    "[DEBUG] Status: %s, Confidence: %.2f, Motion ratio: %.2f, Window motion ratio: %.2f",
+                    status, confidence, self.detector.motion_ratio, self.detector.window_motion_ratio
+                )
         
-        # If status changed, update dashboard
-        if changed:
-            dashboard_status = "occupied" if status == "occupied" else "available"
-            
-            # Only send if different from what we last sent (avoid redundant API calls)
-            if dashboard_status != self.last_dashboard_status:
-                success = self.dashboard.update_room_status(self.room_id, dashboard_status)
+        # last_dashboard_status / cleaning_action_created are shared with the
+        # dashboard worker, so they are only touched under _pending_lock
+        with self._pending_lock:
+            # If status changed, queue a dashboard update
+            if changed:
+                dashboard_status = "occupied" if status == "occupied" else "available"
                 
-                if success:
-                    logger.info(f"→ Dashboard updated: {self.room_name} is {dashboard_status}")
+                # Only send if different from what we last sent (avoid redundant API calls)
+                if dashboard_status != self.last_dashboard_status:
+                    self._pending_status = dashboard_status
                     self.last_dashboard_status = dashboard_status
-            
-            # Reset cleaning flag when room becomes occupied
-            if status == "occupied":
-                self.cleaning_action_created = False
-        
-        # Check if room needs cleaning
-        if status == "available" and not self.cleaning_action_created:
-            if self.detector.should_trigger_cleaning(self.cleaning_timeout_minutes):
-                logger.info(f"Room empty for {self.cleaning_timeout_minutes} minutes")
-                
-                success = self.dashboard.create_action_item(
-                    title=f"{self.room_name} needs cleaning",
-                    description=f"Room has been empty for {self.cleaning_timeout_minutes} minutes and requires cleaning before next patient.",
-                    urgency='normal',
-                    action_type='room_issue',
-                    room_id=self.room_id,
-                    reasoning=f"Automatic detection: Room empty for {self.cleaning_timeout_minutes} minutes after last occupancy"
-                )
+                    self._restart_debounce()
                 
-                if success:
-                    logger.info(f"→ Action item created: Room needs cleaning")
+                # Reset cleaning flag when room becomes occupied
+                if status == "occupied":
+                    self.cleaning_action_created = False
+            
+            # Check if room needs cleaning
+            if status == "available" and not self.cleaning_action_created:
+                if self.detector.should_trigger_cleaning(self.cleaning_timeout_minutes):
+                    logger.info(f"Room empty for {self.cleaning_timeout_minutes} minutes")
+                    self._pending_cleaning = True
+                    # Set up front so later frames don't queue it again; cleared if the send fails
                     self.cleaning_action_created = True
+                    self._restart_debounce()
+    
+    def _restart_debounce(self):
+        """(Re)start the debounce timer for pending updates; caller holds _pending_lock"""
+        if self._debounce_timer is not None:
+            self._debounce_timer.cancel()
+        self._debounce_timer = threading.Timer(UPDATE_DEBOUNCE_SECONDS, self._flush_updates)
+        self._debounce_timer.daemon = True
+        self._debounce_timer.start()
+    
+    def _flush_updates(self):
+        """Debounce window elapsed - hand pending updates to the dashboard worker"""
+        with self._pending_lock:
+            # A newer timer may have been installed while we waited for the lock
+            if self._debounce_timer is threading.current_thread():
+                self._debounce_timer = None
+        
+        try:
+            self._net.submit(self._send_dashboard_updates)
+        except RuntimeError:
+            # Worker already shut down (service stopping)
+            pass
+    
+    def _send_dashboard_updates(self):
+        """Send the latest pending updates (runs on the dashboard worker)"""
+        with self._pending_lock:
+            status, cleaning = self._pending_status, self._pending_cleaning
+            self._pending_status, self._pending_cleaning = None, False
+        
+        if not status and not cleaning:
+            return
+        
+        results = None
+        if status and cleaning:
+            # Both pending at once - send them together in one round trip. Cleaning
+            # waits CLEANING_TIMEOUT_MINUTES after the last status change, so in
+            # practice this only happens with a timeout of 0.
+            results = self.dashboard.update_status_with_action(self.room_id, status, **self._cleaning_action())
+        
+        if results is not None:
+            status_ok, action_ok = results
+        else:
+            status_ok = status is not None and self.dashboard.update_room_status(self.room_id, status)
+            action_ok = cleaning and self.dashboard.create_action_item(**self._cleaning_action())
+        
+        if status_ok:
+            logger.info(f"→ Dashboard updated: {self.room_name} is {status}")
+        if action_ok:
+            logger.info(f"→ Action item created: Room needs cleaning")
+        
+        with self._pending_lock:
+            if status and not status_ok and self.last_dashboard_status == status:
+                # Let the next status change retry
+                self.last_dashboard_status = None
+            if cleaning and not action_ok:
+                self.cleaning_action_created = False
+    
+    def _cleaning_action(self) -> dict:
+        """Arguments for the 'room needs cleaning' action item"""
+        return dict(
+            title=f"{self.room_name} needs cleaning",
+            description=f"Room has been empty for {self.cleaning_timeout_minutes} minutes and requires cleaning before next patient.",
+            urgency='normal',
+            action_type='room_issue',
+            room_id=self.room_id,
+            reasoning=f"Automatic detection: Room empty for {self.cleaning_timeout_minutes} minutes after last occupancy"
+        )
     
     def run(self):
         """Main processing loop"""
@@ -149,18 +228,23 @@ class VisionService:
             return
         
         frame_delay = 1.0 / self.frame_rate
+        slowdown = 1
         
         try:
             while self.running:
                 start_time = time.time()
                 
                 # Process frame
-                self.process_frame()
+                self.process_frame(slowdown)
                 
-                # Maintain frame rate
+                # Back off in an idle room; return to full rate as soon as motion picks up
+                slowdown = IDLE_SLOWDOWN if self.detector.is_idle() else 1
+                
+                # Pace the loop (frames are read in the background)
+                effective_delay = frame_delay * slowdown
                 elapsed = time.time() - start_time
-                if elapsed < frame_delay:
-                    time.sleep(frame_delay - elapsed)
+                if elapsed < effective_delay:
+                    time.sleep(effective_delay - elapsed)
                 
         except KeyboardInterrupt:
             logger.info("")
@@ -173,7 +257,20 @@ class VisionService:
     def stop(self):
         """Stop the vision service"""
         self.running = False
+        with self._pending_lock:
+            if self._debounce_timer is not None:
+                self._debounce_timer.cancel()
+                self._debounce_timer = None
+        
+        # Send anything still inside the debounce window before shutting down.
+        # Run it on the worker so it goes out after any send already in flight.
+        try:
+            self._net.submit(self._send_dashboard_updates).result(timeout=SHUTDOWN_FLUSH_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning(f"Final dashboard update not sent: {e}")
+        self._net.shutdown(wait=False)
         self.camera.disconnect()
+        self.dashboard.close()
         logger.info("Vision service stopped")
 
 